@@ -1,5 +1,69 @@
 import os
 
+# Criteria the judge scores each side on, in the order they appear in the JSON block
+SCORE_CATEGORIES = ("legal_reasoning", "evidence", "persuasiveness")
+SCORE_SIDES = ("for", "against")
+SCORE_RANGE = (1, 10)
+
+# Default generation budgets (max new tokens) per phase; judge budgets are keyed separately
+DEFAULT_TOKEN_BUDGETS = {
+    "opening": 180,
+    "rebuttal": 180,
+    "closing": 180,
+    "evaluation": 512,
+    "verdict": 512,
+}
+
+DEFAULT_REBUTTAL_ROUNDS = 2
+MAX_REBUTTAL_ROUNDS = 10
+
+ORDINALS = ["FIRST", "SECOND", "THIRD", "FOURTH", "FIFTH",
+            "SIXTH", "SEVENTH", "EIGHTH", "NINTH", "TENTH"]
+
+def build_trial_phases(rebuttal_rounds=DEFAULT_REBUTTAL_ROUNDS, token_budgets=None):
+    """
+    Build the ordered list of phases making up a trial
+    
+    Each phase is a dictionary with:
+        phase: Phase name ("opening", "rebuttal", "closing", "verdict")
+        round: Round within the phase, starting at 1
+        title: Transcript section heading
+        speakers: Sides that speak in this phase, in order
+        rebut: Whether speakers rebut the opponent's previous statement
+        max_tokens: Generation budget for each speaker
+        judge: None, "evaluate" to score the phase, or "verdict" for the final ruling
+        judge_max_tokens: Generation budget for the judge
+    
+    Args:
+        rebuttal_rounds: Number of rebuttal rounds between openings and closings
+        token_budgets: Overrides for DEFAULT_TOKEN_BUDGETS
+        
+    Returns:
+        List of phase dictionaries
+    """
+    budgets = dict(DEFAULT_TOKEN_BUDGETS, **(token_budgets or {}))
+    speakers = ["for", "against"]
+    
+    def phase(name, round_number, title, judge, rebut=False, phase_speakers=speakers):
+        return {
+            "phase": name,
+            "round": round_number,
+            "title": title,
+            "speakers": list(phase_speakers),
+            "rebut": rebut,
+            "max_tokens": budgets.get(name),
+            "judge": judge,
+            "judge_max_tokens": budgets["verdict"] if judge == "verdict" else budgets["evaluation"],
+        }
+    
+    phases = [phase("opening", 1, "OPENING STATEMENTS", "evaluate")]
+    for round_number in range(1, rebuttal_rounds + 1):
+        phases.append(phase("rebuttal", round_number, f"{ORDINALS[round_number - 1]} REBUTTALS",
+                            "evaluate", rebut=True))
+    phases.append(phase("closing", 1, "CLOSING ARGUMENTS", None))
+    phases.append(phase("verdict", 1, "FINAL VERDICT", "verdict", phase_speakers=[]))
+    return phases
+
 class SimulationConfig:
     """Configuration class for courtroom simulation"""
     
@@ -16,7 +80,14 @@ works for training large language models without explicit permission or compensa
                  transcript_output=None,
                  judge_model_path=None,
                  lawyer_for_model_path=None,
-                 lawyer_against_model_path=None):
+                 lawyer_against_model_path=None,
+                 results_dir=None,
+                 rebuttal_rounds=None,
+                 token_budgets=None,
+                 offload=None,
+                 offload_dir=None,
+                 gpu_budget_gb=None,
+                 shared_dir=None):
         """
         Initialize simulation configuration
         
@@ -28,6 +99,13 @@ works for training large language models without explicit permission or compensa
             judge_model_path: Path to judge model
             lawyer_for_model_path: Path to model for lawyer arguing for the motion
             lawyer_against_model_path: Path to model for lawyer arguing against the motion
+            results_dir: Directory for structured per-turn records (disabled if not given)
+            rebuttal_rounds: Number of rebuttal rounds (1-10, defaults to 2)
+            token_budgets: Per-phase generation budgets overriding DEFAULT_TOKEN_BUDGETS
+            offload: Where idle models are kept, "cpu" or "disk" (all models stay loaded if not given)
+            offload_dir: Directory for disk-offloaded weights
+            gpu_budget_gb: GiB of model weights allowed on the GPU at once when offloading
+            shared_dir: Directory of memory-mapped indexes and weights shared by worker processes
         """
         # Use provided values or defaults
         self.case_description = case_description or self.DEFAULT_CASE_DESCRIPTION
@@ -42,6 +120,19 @@ works for training large language models without explicit permission or compensa
         
         # Output path
         self.transcript_output = transcript_output or os.path.join(base_dir, "courtroom_transcript.txt")
+        self.results_dir = results_dir
+        
+        # Trial structure
+        self.rebuttal_rounds = DEFAULT_REBUTTAL_ROUNDS if rebuttal_rounds is None else rebuttal_rounds
+        self.token_budgets = dict(DEFAULT_TOKEN_BUDGETS, **(token_budgets or {}))
+        
+        # Model residency
+        self.offload = offload
+        self.offload_dir = offload_dir or (os.path.join(base_dir, "offload") if offload == "disk" else None)
+        self.gpu_budget_gb = gpu_budget_gb
+        
+        # Shared-memory mode for running several workers on one host
+        self.shared_dir = shared_dir
         
         # Model paths
         # These should be provided by user, no good defaults for local paths
@@ -49,6 +140,15 @@ works for training large language models without explicit permission or compensa
         self.lawyer_for_model_path = lawyer_for_model_path
         self.lawyer_against_model_path = lawyer_against_model_path
         
+    def trial_phases(self):
+        """
+        Build the trial structure described by this configuration
+        
+        Returns:
+            List of phase dictionaries (see build_trial_phases)
+        """
+        return build_trial_phases(self.rebuttal_rounds, self.token_budgets)
+        
     def validate(self):
         """
         Validate configuration settings
@@ -64,6 +164,23 @@ works for training large language models without explicit permission or compensa
         if not self.lawyer_against_model_path:
             return False, "Lawyer 'against' model path is required"
             
+        # Check trial structure
+        if not 1 <= self.rebuttal_rounds <= MAX_REBUTTAL_ROUNDS:
+            return False, f"Rebuttal rounds must be between 1 and {MAX_REBUTTAL_ROUNDS}"
+        for name, budget in self.token_budgets.items():
+            if name not in DEFAULT_TOKEN_BUDGETS:
+                return False, f"Unknown token budget phase: {name}"
+            if not isinstance(budget, int) or budget <= 0:
+                return False, f"Token budget for {name} must be a positive integer"
+            
+        # Check model residency settings
+        if self.offload not in (None, "cpu", "disk"):
+            return False, f"Unsupported offload target: {self.offload}"
+        if self.gpu_budget_gb is not None and self.gpu_budget_gb <= 0:
+            return False, "GPU budget must be positive"
+        if self.offload and self.shared_dir:
+            return False, "Model offload cannot be combined with shared model weights"
+            
         # Check if input documents exist
         if not os.path.exists(self.for_motion_doc):
             return False, f"Document for motion not found at {self.for_motion_doc}"
@@ -77,5 +194,12 @@ works for training large language models without explicit permission or compensa
                 os.makedirs(output_dir, exist_ok=True)
             except Exception as e:
                 return False, f"Could not create output directory {output_dir}: {e}"
+        
+        # Ensure results directory exists
+        if self.results_dir and not os.path.exists(self.results_dir):
+            try:
+                os.makedirs(self.results_dir, exist_ok=True)
+            except Exception as e:
+                return False, f"Could not create results directory {self.results_dir}: {e}"
                 
         return True, "" 
\ No newline at end of file
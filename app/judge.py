@@ -1,6 +1,11 @@
-from app.utils.text_processing import generate_response
+from app.statement import Statement
+from app.utils.text_processing import generate_response, generate_scores, format_scores
 
 class JudgeAgent:
+    # Retrieval query and number of chunks used to ground every evaluation
+    CONTEXT_QUERY = "Key legal principles for fair use and copyright in digital contexts"
+    CONTEXT_K = 4
+    
     def __init__(self, model, tokenizer, combined_vector_store, case_description):
         """
         Initialize judge agent
@@ -16,23 +21,25 @@ class JudgeAgent:
         self.vector_store = combined_vector_store
         self.case_description = case_description
         
-    def evaluate_arguments(self, for_argument, against_argument, stage, document_indexer):
+    def evaluate_arguments(self, for_argument, against_argument, stage, document_indexer, max_tokens=512):
         """
         Evaluate lawyer arguments with clear scoring
         
         Args:
-            for_argument: Text of "for" side argument
-            against_argument: Text of "against" side argument
+            for_argument: Text of "for" side argument, without speaker label
+            against_argument: Text of "against" side argument, without speaker label
             stage: Current stage of the simulation ("opening", "rebuttal", "FINAL")
             document_indexer: DocumentIndexer instance
+            max_tokens: Maximum number of tokens for the written evaluation
             
         Returns:
-            Judge's evaluation text
+            Statement holding the evaluation text and the scores dictionary
+            Scores are None for the final verdict or if scoring failed
         """
         # Gather relevant legal principles
-        query = "Key legal principles for fair use and copyright in digital contexts"
-        docs = document_indexer.retrieve_relevant_text(query, self.vector_store, k=4)
+        docs = document_indexer.retrieve_relevant_text(self.CONTEXT_QUERY, self.vector_store, k=self.CONTEXT_K)
         legal_context = "\n\n".join([doc.page_content for doc in docs])
+        stats = {"retrieved_chunks": document_indexer.chunk_ids(docs)}
         
         prompt = f"""Case: {self.case_description}
 
@@ -45,15 +52,26 @@ Book Authors' argument:
 LLM Companies' argument:
 {against_argument}
 
-As the Judge, evaluate these {stage} arguments concisely. If final verdict, state winner with reasoning. Otherwise, score each side (1-10) and score should not be same for both on: Legal Reasoning, Evidence, Persuasiveness.
+As the Judge, evaluate these {stage} arguments concisely. If final verdict, state winner with reasoning. Otherwise, compare each side on: Legal Reasoning, Evidence, Persuasiveness.
 """
         
-        response = generate_response(prompt, self.model, self.tokenizer, max_tokens=512)
+        context = {} if stage != "FINAL" else None
+        response = generate_response(prompt, self.model, self.tokenizer, max_tokens=max_tokens,
+                                     stats=stats, context=context)
         
-        # Let's ensure scores are present if not final verdict
-        from app.utils.text_processing import extract_scores
-        if stage != "FINAL" and not any(keyword in response.lower() for keyword in ["score", "rating", "point", "legal reasoning", "evidence", "persuasiveness"]):
-            # Add default scoring if none detected
-            response += "\n\nScores - Book Authors: Legal Reasoning: 7, Evidence: 7, Persuasiveness: 7. LLM Companies: Legal Reasoning: 7, Evidence: 7, Persuasiveness: 7."
+        if stage == "FINAL":
+            return Statement("judge", "Judge", stage, response, stats=stats)
         
-        return f"Judge ({stage}):\n{response}" 
\ No newline at end of file
+        # Score both sides in a constrained pass that continues from the evaluation's
+        # cache, so only these instructions are read rather than the whole prompt again
+        scoring_prompt = """
+
+Score each side from 1 to 10 on each criterion; the two sides should not receive identical scores.
+Scores JSON:
+"""
+        scores = generate_scores(scoring_prompt, self.model, self.tokenizer, stats=stats,
+                                 context=context) if context else None
+        if scores:
+            response += "\n\n" + format_scores(scores)
+        
+        return Statement("judge", "Judge", stage, response, stats=stats, scores=scores)
\ No newline at end of file
@@ -1,4 +1,4 @@
-import re
+from app.statement import Statement
 from app.utils.text_processing import generate_response
 
 class LawyerAgent:
@@ -26,32 +26,44 @@ class LawyerAgent:
             self.agent_name = "LLM Companies' Counsel"
             self.position = "arguing that using published works falls under fair use without requiring additional permissions"
             
-    def generate_argument(self, stage, document_indexer, previous_arguments=None, rebuttal_to=None):
+    def build_query(self, stage, rebuttal_to=None):
         """
-        Generate a lawyer argument
+        Build the retrieval query for a stage
         
         Args:
             stage: "opening", "rebuttal", or "closing"
-            document_indexer: DocumentIndexer instance
-            previous_arguments: List of previous arguments (optional)
             rebuttal_to: Text to rebut (optional, for rebuttal stage)
             
         Returns:
-            Generated argument text with agent label
+            Query text
         """
-        # Build query based on stage
         if stage == "opening":
-            query = f"Legal arguments {self.position}"
+            return f"Legal arguments {self.position}"
         elif stage == "rebuttal" and rebuttal_to:
-            query = f"Counter this: {rebuttal_to}"
+            return f"Counter this: {rebuttal_to}"
         elif stage == "closing":
-            query = f"Summarize strongest points {self.position}"
-        else:
-            query = f"Legal arguments for {self.side} side in copyright case"
+            return f"Summarize strongest points {self.position}"
+        return f"Legal arguments for {self.side} side in copyright case"
+            
+    def generate_argument(self, stage, document_indexer, previous_arguments=None, rebuttal_to=None, max_tokens=180):
+        """
+        Generate a lawyer argument
         
+        Args:
+            stage: "opening", "rebuttal", or "closing"
+            document_indexer: DocumentIndexer instance
+            previous_arguments: List of previous arguments (optional)
+            rebuttal_to: Text to rebut (optional, for rebuttal stage)
+            max_tokens: Maximum number of tokens to generate
+            
+        Returns:
+            Statement holding the argument text and generation statistics
+        """
         # Retrieve relevant document sections
+        query = self.build_query(stage, rebuttal_to)
         docs = document_indexer.retrieve_relevant_text(query, self.vector_store)
         context = "\n\n".join([doc.page_content for doc in docs])
+        stats = {"retrieved_chunks": document_indexer.chunk_ids(docs)}
         
         # Build concise prompt - critically, we don't want to overwhelm the model
         prompt = f"""Case: {self.case_description}
@@ -65,10 +77,10 @@ As the {self.agent_name}, {self.position}, provide a concise and powerful {stage
             prompt += f"Directly counter this argument: '{rebuttal_to}'"
         
         # Generate the response with length control
-        response = generate_response(prompt, self.model, self.tokenizer, max_tokens=180)
+        response = generate_response(prompt, self.model, self.tokenizer, max_tokens=max_tokens, stats=stats)
         
         # Ensure we have a complete statement
         if not response.endswith(('.', '!', '?')):
             response += "."
         
-        return f"{self.agent_name} ({stage}): {response}" 
\ No newline at end of file
+        return Statement(self.side, self.agent_name, stage, response, stats=stats) 
\ No newline at end of file
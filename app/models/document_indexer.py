@@ -1,19 +1,63 @@
 import os
+import torch
 from langchain.vectorstores import FAISS
 from langchain.embeddings import HuggingFaceEmbeddings
+from app.models.model_loader import checkpoint_fingerprint
+from app.models.shared_memory import (
+    content_key, share_weights, load_mmap_weights, save_shared_index, load_shared_index
+)
 
 class DocumentIndexer:
-    def __init__(self, embedding_model_name="sentence-transformers/all-MiniLM-L6-v2"):
+    def __init__(self, embedding_model_name="sentence-transformers/all-MiniLM-L6-v2", shared_dir=None):
         """
         Initialize the document indexer
         
         Args:
             embedding_model_name: Name of the HuggingFace embedding model to use
+            shared_dir: Directory of memory-mapped indexes and weights shared
+                between worker processes (disabled if not given)
         """
-        self.embedding_model = HuggingFaceEmbeddings(model_name=embedding_model_name)
+        self.embedding_model_name = embedding_model_name
         self.k = 3  # Number of relevant chunks to retrieve
         
-    def load_and_chunk_document(self, file_path, chunk_size=500, overlap=100):
+        self.shared_dir = shared_dir
+        if shared_dir:
+            os.makedirs(shared_dir, exist_ok=True)
+            self.embedding_model = self._load_shared_embeddings()
+        else:
+            self.embedding_model = HuggingFaceEmbeddings(model_name=embedding_model_name)
+    
+    def _load_shared_embeddings(self):
+        """
+        Load the embedding model with weights mapped from the shared directory
+        
+        When the shared weights file exists, the model is built on the meta
+        device, so loading the checkpoint does not materialize a private copy
+        of the weights. Otherwise the model is loaded normally, exported, and
+        then re-pointed at the file.
+        
+        Returns:
+            HuggingFaceEmbeddings instance
+        """
+        weights_file = os.path.join(
+            self.shared_dir, f"embeddings-{checkpoint_fingerprint(self.embedding_model_name)}.safetensors")
+        
+        if not os.path.exists(weights_file):
+            embedding_model = HuggingFaceEmbeddings(model_name=self.embedding_model_name)
+            share_weights(embedding_model.client, weights_file)
+            return embedding_model
+        
+        with torch.device("meta"):
+            embedding_model = HuggingFaceEmbeddings(
+                model_name=self.embedding_model_name, model_kwargs={"device": "meta"})
+        client = embedding_model.client
+        load_mmap_weights(client, weights_file)
+        # Older sentence-transformers move the model to this device before encoding
+        if hasattr(client, "_target_device"):
+            client._target_device = torch.device("cpu")
+        return embedding_model
+        
+    def load_and_chunk_document(self, file_path, chunk_size=500, overlap=100, min_chunk_size=200):
         """
         Load a document and split it into overlapping chunks
         
@@ -21,6 +65,7 @@ class DocumentIndexer:
             file_path: Path to the document file
             chunk_size: Size of each chunk in characters
             overlap: Overlap between chunks
+            min_chunk_size: Chunks of this many characters or fewer are dropped
             
         Returns:
             List of document chunks
@@ -32,7 +77,7 @@ class DocumentIndexer:
             chunks = []
             for i in range(0, len(text), chunk_size - overlap):
                 chunk = text[i:i + chunk_size]
-                if len(chunk) > 200:  # Only include substantive chunks
+                if len(chunk) > min_chunk_size:  # Only include substantive chunks
                     chunks.append(chunk)
             
             return chunks
@@ -40,22 +85,75 @@ class DocumentIndexer:
             print(f"Error loading document {file_path}: {e}")
             return []
     
-    def create_faiss_index(self, texts, doc_source=None):
+    def build_case_indexes(self, for_motion_doc, against_motion_doc, **chunking):
+        """
+        Chunk both briefs and build the vector stores used by the agents
+        
+        Args:
+            for_motion_doc: Path to document arguing for the motion
+            against_motion_doc: Path to document arguing against the motion
+            **chunking: chunk_size, overlap and min_chunk_size passed to load_and_chunk_document
+            
+        Returns:
+            Tuple of (for store, against store, combined store for the judge)
+        """
+        doc_for_chunks = self.load_and_chunk_document(for_motion_doc, **chunking)
+        doc_against_chunks = self.load_and_chunk_document(against_motion_doc, **chunking)
+        
+        vector_store_for = self.create_faiss_index(doc_for_chunks, "for_motion")
+        vector_store_against = self.create_faiss_index(doc_against_chunks, "against_motion")
+        
+        # Keep each chunk's source in the combined store for retrieval records
+        combined_chunks = doc_for_chunks + doc_against_chunks
+        combined_metadatas = (
+            [{"source": "for_motion", "index": i} for i in range(len(doc_for_chunks))] +
+            [{"source": "against_motion", "index": i} for i in range(len(doc_against_chunks))]
+        )
+        combined_vector_store = self.create_faiss_index(combined_chunks, metadatas=combined_metadatas)
+        
+        return vector_store_for, vector_store_against, combined_vector_store
+    
+    def create_faiss_index(self, texts, doc_source=None, metadatas=None):
         """
         Create a FAISS vector index from text chunks
         
         Args:
             texts: List of text chunks
             doc_source: Source identifier for the documents
+            metadatas: Per-chunk metadata, overriding the metadata built from doc_source
             
         Returns:
             FAISS index object or None if texts is empty
         """
         if not texts:
             return None
-        metadatas = [{"source": doc_source, "index": i} for i in range(len(texts))] if doc_source else None
+        if metadatas is None and doc_source:
+            metadatas = [{"source": doc_source, "index": i} for i in range(len(texts))]
+        if self.shared_dir:
+            return self.create_shared_faiss_index(texts, metadatas)
         return FAISS.from_texts(texts, self.embedding_model, metadatas=metadatas)
     
+    def create_shared_faiss_index(self, texts, metadatas=None):
+        """
+        Build a FAISS index once in the shared directory and memory-map it
+        
+        The first worker to need an index embeds and serializes it; every
+        worker, including that one, then maps the same file.
+        
+        Args:
+            texts: List of text chunks
+            metadatas: Per-chunk metadata
+            
+        Returns:
+            FAISS index object
+        """
+        key = content_key(self.embedding_model_name, texts, metadatas)
+        path = os.path.join(self.shared_dir, f"index-{key}")
+        if not os.path.exists(path):
+            vector_store = FAISS.from_texts(texts, self.embedding_model, metadatas=metadatas)
+            save_shared_index(vector_store, path)
+        return load_shared_index(path, self.embedding_model)
+    
     def retrieve_relevant_text(self, question, vector_store, k=None):
         """
         Retrieve relevant document chunks based on a query
@@ -70,4 +168,17 @@ class DocumentIndexer:
         """
         if vector_store:
             return vector_store.similarity_search(question, k=k or self.k)
-        return [] 
\ No newline at end of file
+        return [] 
+    
+    def chunk_ids(self, docs):
+        """
+        Build stable identifiers for retrieved chunks
+        
+        Args:
+            docs: Documents returned by retrieve_relevant_text
+            
+        Returns:
+            List of "source:index" strings, skipping chunks without metadata
+        """
+        return [f"{doc.metadata['source']}:{doc.metadata['index']}"
+                for doc in docs if "source" in doc.metadata and "index" in doc.metadata]
\ No newline at end of file
@@ -1,22 +1,94 @@
 import os
+import hashlib
 import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer
+from transformers import AutoConfig, AutoModelForCausalLM, AutoTokenizer, GenerationConfig
+from app.models.shared_memory import content_key, share_weights, load_mmap_weights
 
-def load_model(model_path):
+# Shared models run on the CPU, where float16 matmuls are unsupported or very slow
+SHARED_MODEL_DTYPE = torch.bfloat16
+
+def load_model(model_path, device_map="auto", torch_dtype=torch.float16):
     """
     Load a language model and its tokenizer
     
     Args:
         model_path: Path to the model directory
+        device_map: Device placement passed to from_pretrained (None loads onto the CPU)
+        torch_dtype: Data type of the loaded weights
         
     Returns:
         Tuple of (model, tokenizer)
     """
     model = AutoModelForCausalLM.from_pretrained(
         model_path, 
-        torch_dtype=torch.float16, 
-        device_map="auto"
+        torch_dtype=torch_dtype, 
+        device_map=device_map,
+        low_cpu_mem_usage=True
     )
     model.gradient_checkpointing_enable()
     tokenizer = AutoTokenizer.from_pretrained(model_path)
-    return model, tokenizer 
\ No newline at end of file
+    return model, tokenizer 
+
+def checkpoint_fingerprint(model_path):
+    """
+    Fingerprint a checkpoint so cached copies of its weights can be invalidated
+    
+    Local checkpoints are identified by the name, size and modification time of
+    every file in the directory, so replacing the checkpoint at the same path
+    gives a new fingerprint. Hub model names are identified by the name alone.
+    
+    Args:
+        model_path: Path to the model directory, or a Hugging Face model name
+        
+    Returns:
+        Short hex digest
+    """
+    digest = hashlib.sha256()
+    if os.path.isdir(model_path):
+        digest.update(os.path.abspath(model_path).encode("utf-8"))
+        for name in sorted(os.listdir(model_path)):
+            stat = os.stat(os.path.join(model_path, name))
+            digest.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+    else:
+        digest.update(model_path.encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+def load_shared_model(model_path, shared_dir):
+    """
+    Load a language model whose weights are memory-mapped from a shared file
+    
+    The first worker loads the model normally and exports its weights as a
+    single safetensors file; later workers build the model on the meta device
+    and map that file, so all workers share one copy through the OS page
+    cache. The model runs on the CPU, where the mapping is kept, in
+    bfloat16 since CPU float16 kernels are missing or very slow.
+    
+    Args:
+        model_path: Path to the model directory
+        shared_dir: Directory of shared weight files
+        
+    Returns:
+        Tuple of (model, tokenizer)
+    """
+    # Named by the checkpoint's file metadata, so an updated checkpoint is exported afresh
+    key = content_key(checkpoint_fingerprint(model_path), str(SHARED_MODEL_DTYPE))
+    weights_file = os.path.join(shared_dir, f"model-{key}.safetensors")
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    
+    if os.path.exists(weights_file):
+        config = AutoConfig.from_pretrained(model_path)
+        with torch.device("meta"):
+            model = AutoModelForCausalLM.from_config(config, torch_dtype=SHARED_MODEL_DTYPE)
+        load_mmap_weights(model, weights_file)
+        # from_config only derives generation settings from config.json, so read the
+        # checkpoint's own (e.g. extra eos_token_id entries) as from_pretrained does
+        try:
+            model.generation_config = GenerationConfig.from_pretrained(model_path)
+        except OSError:
+            pass  # Checkpoint has no generation_config.json
+    else:
+        model, _ = load_model(model_path, device_map=None, torch_dtype=SHARED_MODEL_DTYPE)
+        share_weights(model, weights_file)
+    
+    model.eval()
+    return model, tokenizer
\ No newline at end of file
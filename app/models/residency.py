@@ -0,0 +1,247 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+import torch
+from safetensors import safe_open
+from app.models.model_loader import load_model, checkpoint_fingerprint
+from app.models.shared_memory import export_weights
+
+# Free memory left for the active model's activations and KV cache when prefetching
+PREFETCH_HEADROOM_BYTES = 2 ** 30
+
+def model_bytes(model):
+    """Size of a model's parameters and buffers in bytes"""
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+class ModelResidencyManager:
+    def __init__(self, device=None, offload="cpu", offload_dir=None, gpu_budget_gb=None):
+        """
+        Keep only the active agent's model on the accelerator
+
+        Idle models are offloaded to CPU RAM, or to safetensors files on disk
+        that are memory-mapped back in when needed. While one agent speaks,
+        the next speaker's model is prefetched in the background if it fits
+        alongside the active one.
+
+        Args:
+            device: Device that runs generation (defaults to CUDA when available)
+            offload: Where idle models live, "cpu" or "disk"
+            offload_dir: Directory for offloaded weights (required for "disk")
+            gpu_budget_gb: Model weights allowed on the device at once, in GiB
+                (defaults to the free memory reported by CUDA)
+        """
+        if offload not in ("cpu", "disk"):
+            raise ValueError(f"Unsupported offload target: {offload}")
+        if offload == "disk" and not offload_dir:
+            raise ValueError("offload_dir is required for disk offload")
+
+        self.device = torch.device(device or ("cuda" if torch.cuda.is_available() else "cpu"))
+        self.offload = offload
+        self.offload_dir = offload_dir
+        self.gpu_budget = int(gpu_budget_gb * 2 ** 30) if gpu_budget_gb else None
+        if offload_dir:
+            os.makedirs(offload_dir, exist_ok=True)
+
+        self.entries = {}  # model path -> entry dictionary
+        self.roles = {}  # agent role -> model path
+        self.swap_log = []
+
+        # Held for a whole turn so concurrent trials cannot evict a model mid-generation
+        self.turn_lock = threading.RLock()
+        self.prefetch_thread = None
+
+    def load(self, role, model_path):
+        """
+        Load a model for an agent role and place it in offloaded storage
+
+        Roles that use the same model path share a single copy.
+
+        Args:
+            role: Agent role ("judge", "for" or "against")
+            model_path: Path to the model directory
+
+        Returns:
+            Tuple of (model, tokenizer)
+        """
+        if model_path not in self.entries:
+            model, tokenizer = load_model(model_path, device_map=None)
+            entry = {
+                "path": model_path,
+                "model": model,
+                "tokenizer": tokenizer,
+                "location": "cpu",
+                "lock": threading.Lock(),
+                "weights_file": None,
+            }
+            if self.offload == "disk":
+                # A changed checkpoint at the same path gets a new file rather than stale weights
+                digest = checkpoint_fingerprint(model_path)
+                name = os.path.basename(os.path.normpath(model_path))
+                entry["weights_file"] = os.path.join(self.offload_dir, f"{name}-{digest}.safetensors")
+            self.entries[model_path] = entry
+        self.roles[role] = model_path
+
+        entry = self.entries[model_path]
+        with entry["lock"]:
+            self._offload(entry)
+        return entry["model"], entry["tokenizer"]
+
+    def _record_swap(self, entry, source, target, start, prefetch=False):
+        """Log the duration of a model move"""
+        seconds = time.perf_counter() - start
+        roles = ", ".join(role for role, path in self.roles.items() if path == entry["path"])
+        self.swap_log.append({
+            "roles": roles,
+            "model": entry["path"],
+            "from": source,
+            "to": target,
+            "seconds": seconds,
+            "prefetch": prefetch,
+        })
+        kind = "prefetch" if prefetch else "swap"
+        print(f"[residency] {kind} {roles} ({os.path.basename(entry['path'])}): {source} -> {target} in {seconds:.2f}s")
+
+    def _offload(self, entry):
+        """Move a model off the accelerator into its offload storage"""
+        source = entry["location"]
+        if source == self.offload:
+            return
+        start = time.perf_counter()
+        model = entry["model"]
+
+        if self.offload == "disk":
+            # Weights never change during a trial, so they are written once, atomically
+            export_weights(model, entry["weights_file"])
+            model.to("meta")
+        else:
+            model.to("cpu")
+
+        entry["location"] = self.offload
+        torch.cuda.empty_cache()
+        self._record_swap(entry, source, self.offload, start)
+
+    def _load_from_disk(self, entry):
+        """Allocate a model on the device and fill it from its offload file"""
+        model = entry["model"]
+        model.to_empty(device=self.device)
+        # Tied weights are saved once and split by the moves, so re-tie them first
+        if hasattr(model, "tie_weights"):
+            model.tie_weights()
+        params = dict(model.named_parameters())
+        buffers = dict(model.named_buffers())
+        filled = set()
+        with torch.no_grad(), safe_open(entry["weights_file"], framework="pt", device=str(self.device)) as f:
+            for name in f.keys():
+                tensor = params[name] if name in params else buffers[name]
+                tensor.copy_(f.get_tensor(name))
+                filled.add(name)
+
+        missing = sorted((set(params) | set(buffers)) - filled)
+        if missing:
+            raise ValueError(f"Offloaded weights {entry['weights_file']} are missing tensors: "
+                             f"{', '.join(missing[:5])}")
+
+    def _fits_on_device(self, entry):
+        """Check whether a model can join those already on the device"""
+        if self.device.type != "cuda":
+            return True
+        needed = model_bytes(entry["model"])
+        if self.gpu_budget is not None:
+            resident = sum(model_bytes(other["model"]) for other in self.entries.values()
+                           if other["location"] == str(self.device))
+            return resident + needed <= self.gpu_budget
+        free, _ = torch.cuda.mem_get_info(self.device)
+        return needed + PREFETCH_HEADROOM_BYTES <= free
+
+    def _bring_in(self, entry, prefetch=False):
+        """Move a model onto the accelerator"""
+        source = entry["location"]
+        target = str(self.device)
+        if source == target:
+            return
+        start = time.perf_counter()
+        model = entry["model"]
+
+        try:
+            if source == "disk":
+                self._load_from_disk(entry)
+            else:
+                model.to(self.device)
+        except Exception:
+            # Return any partly moved weights to offload storage so they are not leaked on the device
+            model.to("meta" if source == "disk" else source)
+            torch.cuda.empty_cache()
+            raise
+
+        entry["location"] = target
+        self._record_swap(entry, source, target, start, prefetch=prefetch)
+
+    def _wait_for_prefetch(self):
+        """Block until any background prefetch has finished"""
+        if self.prefetch_thread is not None:
+            self.prefetch_thread.join()
+            self.prefetch_thread = None
+
+    def activate(self, role):
+        """
+        Make a role's model the only one resident on the accelerator
+
+        Args:
+            role: Agent role to activate
+        """
+        self._wait_for_prefetch()
+        active_path = self.roles[role]
+        for path, entry in self.entries.items():
+            if path != active_path:
+                with entry["lock"]:
+                    self._offload(entry)
+        entry = self.entries[active_path]
+        with entry["lock"]:
+            self._bring_in(entry)
+
+    def prefetch(self, role):
+        """
+        Start moving a role's model onto the accelerator in the background
+
+        The prefetch is skipped when the model would not fit next to the ones
+        already resident, within gpu_budget_gb or the free CUDA memory.
+
+        Args:
+            role: Agent role expected to speak next
+        """
+        entry = self.entries[self.roles[role]]
+        if entry["location"] == str(self.device):
+            return
+        if not self._fits_on_device(entry):
+            # activate() will swap it in once the current model is offloaded
+            print(f"[residency] skipping prefetch for {role}: not enough free device memory")
+            return
+
+        def run():
+            try:
+                with entry["lock"]:
+                    self._bring_in(entry, prefetch=True)
+            except Exception as e:
+                # activate() will load the model synchronously instead
+                print(f"Error prefetching model for {role}: {e}")
+
+        self._wait_for_prefetch()
+        self.prefetch_thread = threading.Thread(target=run, daemon=True)
+        self.prefetch_thread.start()
+
+    @contextmanager
+    def use(self, role, next_role=None):
+        """
+        Hold a role's model on the accelerator for one turn
+
+        Args:
+            role: Agent role taking the turn
+            next_role: Agent role expected to speak next, prefetched during the turn
+        """
+        with self.turn_lock:
+            self.activate(role)
+            if next_role is not None:
+                self.prefetch(next_role)
+            yield
@@ -0,0 +1,138 @@
+import os
+import json
+import shutil
+import pickle
+import hashlib
+import tempfile
+import faiss
+import torch
+from safetensors import safe_open
+from safetensors.torch import save_file
+from langchain.vectorstores import FAISS
+
+# Newer faiss releases provide IO_FLAG_MMAP_IFC to memory-map the flat indexes LangChain
+# builds. The fallback flags only map IVF inverted lists, so on older faiss a flat index
+# is still read into private memory by each worker.
+FLAT_INDEX_MMAP = hasattr(faiss, "IO_FLAG_MMAP_IFC")
+MMAP_FLAGS = faiss.IO_FLAG_MMAP_IFC if FLAT_INDEX_MMAP else faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+
+def content_key(*parts):
+    """
+    Hash the inputs that determine a shared artifact
+
+    Args:
+        *parts: JSON-serializable values (texts, metadata, model names)
+
+    Returns:
+        Short hex digest used in shared file names
+    """
+    payload = json.dumps(parts, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()[:16]
+
+def export_weights(module, path):
+    """
+    Write a module's parameters and buffers to a safetensors file once
+
+    Several workers may race to export the same weights; each writes a
+    private temporary file and renames it into place atomically. The last
+    rename wins, which is harmless because every writer produces the same
+    content.
+
+    Args:
+        module: torch.nn.Module whose weights to export
+        path: Destination safetensors file
+    """
+    if os.path.exists(path):
+        return
+    tensors = dict(module.named_parameters())
+    tensors.update(module.named_buffers())
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    os.close(fd)
+    save_file({name: t.detach().cpu().contiguous() for name, t in tensors.items()}, temp_path)
+    os.replace(temp_path, path)
+
+def load_mmap_weights(module, path):
+    """
+    Point a module's parameters and buffers at a memory-mapped safetensors file
+
+    The tensors are backed by the OS page cache rather than private memory,
+    so processes mapping the same file share one physical copy. They must
+    stay on the CPU; moving them to another device makes a private copy.
+
+    Args:
+        module: torch.nn.Module to fill, possibly created on the meta device
+        path: safetensors file written by export_weights
+
+    Raises:
+        ValueError: If the file does not cover every parameter and buffer
+    """
+    with safe_open(path, framework="pt", device="cpu") as f:
+        for name in f.keys():
+            owner_name, _, attr = name.rpartition(".")
+            owner = module.get_submodule(owner_name)
+            tensor = f.get_tensor(name)
+            if attr in owner._parameters:
+                owner._parameters[attr] = torch.nn.Parameter(tensor, requires_grad=False)
+            else:
+                owner._buffers[attr] = tensor
+
+    # Tied weights are exported once, so re-tie them to the mapped tensor
+    if hasattr(module, "tie_weights"):
+        module.tie_weights()
+
+    missing = [name for name, t in list(module.named_parameters()) + list(module.named_buffers())
+               if t.is_meta]
+    if missing:
+        raise ValueError(f"Shared weights file {path} is missing tensors: {', '.join(missing[:5])}")
+
+def share_weights(module, path):
+    """
+    Export a loaded module's weights if needed and swap them for shared mappings
+
+    Args:
+        module: torch.nn.Module holding private weights
+        path: Shared safetensors file
+    """
+    export_weights(module, path)
+    load_mmap_weights(module, path)
+
+def save_shared_index(vector_store, path):
+    """
+    Serialize a FAISS vector store to a shared directory once
+
+    Args:
+        vector_store: LangChain FAISS vector store
+        path: Destination directory
+    """
+    if os.path.exists(path):
+        return
+    temp_path = tempfile.mkdtemp(dir=os.path.dirname(path), suffix=".tmp")
+    vector_store.save_local(temp_path)
+    try:
+        os.rename(temp_path, path)
+    except OSError:
+        # Another worker published the same index first
+        shutil.rmtree(temp_path, ignore_errors=True)
+
+def load_shared_index(path, embedding_model):
+    """
+    Open a shared FAISS vector store with its index memory-mapped
+
+    The index is only mapped when faiss supports IO_FLAG_MMAP_IFC; otherwise
+    each worker reads its own copy. The docstore holding the chunk texts is
+    always unpickled privately.
+
+    Args:
+        path: Directory written by save_shared_index
+        embedding_model: Embeddings used to encode queries
+
+    Returns:
+        LangChain FAISS vector store
+    """
+    if not FLAT_INDEX_MMAP:
+        print("Warning: this faiss version cannot memory-map flat indexes; "
+              "the shared index is read into private memory")
+    index = faiss.read_index(os.path.join(path, "index.faiss"), MMAP_FLAGS)
+    with open(os.path.join(path, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    return FAISS(embedding_model.embed_query, index, docstore, index_to_docstore_id)
@@ -0,0 +1,200 @@
+import os
+import csv
+import glob
+import uuid
+from app.config import SCORE_CATEGORIES, SCORE_SIDES
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Per-side score columns, e.g. "for_legal_reasoning"
+SCORE_COLUMNS = [f"{side}_{category}" for side in SCORE_SIDES for category in SCORE_CATEGORIES]
+
+# Column names and types for one record per trial turn
+COLUMNS = [
+    ("run_id", "string"),
+    ("turn", "int32"),
+    ("phase", "string"),
+    ("round", "int32"),
+    ("agent", "string"),
+    ("prompt_tokens", "int32"),
+    ("gen_tokens", "int32"),
+    ("latency_s", "float64"),
+    ("retrieved_chunks", "string"),
+] + [(name, "int32") for name in SCORE_COLUMNS] + [
+    ("verdict", "string"),
+]
+
+class ResultsStore:
+    def __init__(self, results_dir, file_format=None):
+        """
+        Initialize an append-only store of per-turn trial records
+
+        Each run is written as its own part file in results_dir, so runs are
+        appended without rewriting earlier data and many processes can write
+        to the same directory.
+
+        Args:
+            results_dir: Directory holding the part files
+            file_format: "parquet" or "csv" (defaults to parquet when pyarrow is installed)
+        """
+        if file_format is None:
+            file_format = "parquet" if pa is not None else "csv"
+        if file_format == "parquet" and pa is None:
+            raise ImportError("pyarrow is required to write Parquet results")
+        if file_format not in ("parquet", "csv"):
+            raise ValueError(f"Unsupported results format: {file_format}")
+
+        self.results_dir = results_dir
+        self.file_format = file_format
+        os.makedirs(results_dir, exist_ok=True)
+
+    @staticmethod
+    def new_run_id():
+        """
+        Create a unique identifier for a simulation run
+
+        Returns:
+            Run identifier string
+        """
+        return uuid.uuid4().hex
+
+    @staticmethod
+    def make_record(run_id, turn, phase, round_number, agent, stats=None, latency=None, scores=None, verdict=None):
+        """
+        Build a flat record for one trial turn
+
+        Args:
+            run_id: Identifier of the simulation run
+            turn: Sequential turn number within the run
+            phase: Trial phase ("opening", "rebuttal", "closing", "verdict")
+            round_number: Round within the phase, starting at 1
+            agent: Speaker ("for", "against" or "judge")
+            stats: Token counts and retrieved chunk ids reported by the agent
+            latency: Wall-clock duration of the turn in seconds
+            scores: Judge's scores dictionary, if any
+            verdict: Winning side for the final verdict, if any
+
+        Returns:
+            Dictionary keyed by column name
+        """
+        stats = stats or {}
+        record = {
+            "run_id": run_id,
+            "turn": turn,
+            "phase": phase,
+            "round": round_number,
+            "agent": agent,
+            "prompt_tokens": stats.get("prompt_tokens", 0),
+            "gen_tokens": stats.get("gen_tokens", 0),
+            "latency_s": latency,
+            "retrieved_chunks": ";".join(stats.get("retrieved_chunks", [])),
+            "verdict": verdict,
+        }
+        for side in SCORE_SIDES:
+            for category in SCORE_CATEGORIES:
+                record[f"{side}_{category}"] = scores[side][category] if scores else None
+        return record
+
+    def write_run(self, run_id, records):
+        """
+        Append the records of one run as a new part file
+
+        Args:
+            run_id: Identifier of the simulation run
+            records: List of dictionaries built by make_record
+
+        Returns:
+            Path of the written part file
+        """
+        path = os.path.join(self.results_dir, f"run-{run_id}.{self.file_format}")
+        temp_path = path + ".tmp"
+
+        if self.file_format == "parquet":
+            schema = pa.schema([(name, getattr(pa, dtype)()) for name, dtype in COLUMNS])
+            table = pa.Table.from_pylist(records, schema=schema)
+            pq.write_table(table, temp_path)
+        else:
+            with open(temp_path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.DictWriter(f, fieldnames=[name for name, _ in COLUMNS])
+                writer.writeheader()
+                writer.writerows(records)
+
+        # Publish atomically so readers never see a partially written run
+        os.replace(temp_path, path)
+        return path
+
+def load_results(results_dir):
+    """
+    Load every run in a results directory into one DataFrame
+
+    Args:
+        results_dir: Directory written by ResultsStore
+
+    Returns:
+        pandas DataFrame with one row per trial turn
+    """
+    import pandas as pd
+
+    # Pin text columns so values such as hex run ids are not parsed as numbers
+    text_columns = {name: "string" for name, kind in COLUMNS if kind == "string"}
+    frames = []
+    parquet_files = sorted(glob.glob(os.path.join(results_dir, "run-*.parquet")))
+    if parquet_files:
+        frames.append(pd.read_parquet(parquet_files))
+    for path in sorted(glob.glob(os.path.join(results_dir, "run-*.csv"))):
+        frames.append(pd.read_csv(path, dtype=text_columns))
+
+    if not frames:
+        return pd.DataFrame(columns=[name for name, _ in COLUMNS])
+    results = pd.concat(frames, ignore_index=True)
+    # Score columns are nullable; keep them integer-typed across both formats
+    results[SCORE_COLUMNS] = results[SCORE_COLUMNS].astype("Int32")
+    return results
+
+def win_rates(results):
+    """
+    Fraction of runs won by each side
+
+    Args:
+        results: DataFrame returned by load_results
+
+    Returns:
+        pandas Series indexed by side
+    """
+    verdicts = results.loc[results["phase"] == "verdict", "verdict"]
+    return verdicts.value_counts(normalize=True)
+
+def score_distributions(results):
+    """
+    Summary statistics of judge scores per phase
+
+    Args:
+        results: DataFrame returned by load_results
+
+    Returns:
+        pandas DataFrame of describe() statistics for each score column, grouped by phase
+    """
+    scored = results.dropna(subset=SCORE_COLUMNS, how="all")
+    return scored.groupby("phase")[SCORE_COLUMNS].describe()
+
+def summarize_results(results_dir):
+    """
+    Aggregate win rates and score distributions over all stored runs
+
+    Args:
+        results_dir: Directory written by ResultsStore
+
+    Returns:
+        Dictionary with "runs", "win_rates" and "score_distributions"
+    """
+    results = load_results(results_dir)
+    return {
+        "runs": results["run_id"].nunique(),
+        "win_rates": win_rates(results),
+        "score_distributions": score_distributions(results),
+    }
@@ -0,0 +1,256 @@
+import os
+import gc
+import json
+import math
+import time
+import itertools
+import faiss
+from app.judge import JudgeAgent
+from app.lawyers import LawyerAgent
+
+SOURCES = {"for": "for_motion", "against": "against_motion"}
+
+def load_query_set(path):
+    """
+    Load a labelled retrieval query set
+
+    Each query names the agent ("for", "against" or "judge"), the stage and
+    optional rebuttal text used to build its query with the agent's own
+    template, and lists relevant passages copied verbatim from the briefs.
+
+    Args:
+        path: Path to the JSON query set
+
+    Returns:
+        List of query dictionaries
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["queries"]
+
+def resolve_queries(query_set, case_description):
+    """
+    Turn labelled queries into the exact text each agent would search for
+
+    Args:
+        query_set: Queries returned by load_query_set
+        case_description: Description of the legal case
+
+    Returns:
+        List of query dictionaries with "text" and "store" added
+    """
+    lawyers = {side: LawyerAgent(side, None, None, None, case_description) for side in SOURCES}
+    resolved = []
+    for query in query_set:
+        if query["agent"] == "judge":
+            text = JudgeAgent.CONTEXT_QUERY
+        else:
+            text = lawyers[query["agent"]].build_query(query["stage"], query.get("rebuttal_to"))
+        resolved.append(dict(query, text=text, store=query["agent"]))
+    return resolved
+
+def validate_query_set(query_set, documents):
+    """
+    Check that every query has labelled passages that appear verbatim in its brief
+
+    Args:
+        query_set: Queries returned by load_query_set
+        documents: Mapping of source name to full document text
+
+    Raises:
+        ValueError: If a query has no passages, or a passage names an unknown source or is not found
+    """
+    errors = []
+    for query in query_set:
+        if not query["relevant"]:
+            errors.append(f"{query['id']}: no relevant passages")
+        for passage in query["relevant"]:
+            source = passage["source"]
+            if source not in documents:
+                errors.append(f"{query['id']}: unknown source '{source}'")
+            elif passage["text"] not in documents[source]:
+                errors.append(f"{query['id']}: passage not found in {source}: {passage['text'][:60]!r}")
+    if errors:
+        raise ValueError("Invalid labelled passages:\n" + "\n".join(errors))
+
+def current_rss_bytes():
+    """
+    Resident set size of this process
+
+    Returns:
+        Bytes currently resident, or None where /proc is unavailable
+    """
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE")
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile
+
+    Args:
+        values: Non-empty list of numbers
+        pct: Percentile between 0 and 100
+
+    Returns:
+        Value at the given percentile
+    """
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+def _chunk_spans(docs, documents):
+    """Locate retrieved chunks in their source documents as (source, start, end)"""
+    spans = []
+    for doc in docs:
+        source = doc.metadata.get("source")
+        start = documents[source].find(doc.page_content)
+        if start >= 0:
+            spans.append((source, start, start + len(doc.page_content)))
+    return spans
+
+def score_retrieval(docs, relevant, documents):
+    """
+    Compare retrieved chunks with the labelled relevant passages
+
+    Args:
+        docs: Retrieved documents
+        relevant: Labelled passages ({"source", "text"})
+        documents: Mapping of source name to full document text
+
+    Returns:
+        Tuple of (recall, overlap): the fraction of passages contained whole in
+        a retrieved chunk, and the fraction of passage characters covered by
+        any retrieved chunk
+    """
+    spans = _chunk_spans(docs, documents)
+    found = 0
+    covered = 0
+    total = 0
+    for passage in relevant:
+        start = documents[passage["source"]].find(passage["text"])
+        if start < 0:
+            raise ValueError(f"Labelled passage not found in {passage['source']}: {passage['text'][:60]!r}")
+        end = start + len(passage["text"])
+        total += end - start
+
+        if any(doc.metadata.get("source") == passage["source"] and passage["text"] in doc.page_content
+               for doc in docs):
+            found += 1
+
+        # Characters of the passage inside the union of retrieved chunk spans
+        inside = set()
+        for source, chunk_start, chunk_end in spans:
+            if source == passage["source"]:
+                inside.update(range(max(start, chunk_start), min(end, chunk_end)))
+        covered += len(inside)
+
+    return found / len(relevant), covered / total
+
+def evaluate_config(indexer, queries, documents, for_motion_doc, against_motion_doc,
+                    chunk_size, overlap, min_chunk_size, k_values, repeats):
+    """
+    Build the case indexes with one chunking setting and evaluate every k
+
+    Args:
+        indexer: DocumentIndexer whose embedding model is reused across settings
+        queries: Queries returned by resolve_queries
+        documents: Mapping of source name to full document text
+        for_motion_doc: Path to document arguing for the motion
+        against_motion_doc: Path to document arguing against the motion
+        chunk_size: Size of each chunk in characters
+        overlap: Overlap between chunks
+        min_chunk_size: Chunks of this many characters or fewer are dropped
+        k_values: Values of k to evaluate; None uses each agent's default
+        repeats: Number of timed retrievals per query
+
+    Returns:
+        List of result dictionaries, one per k
+    """
+    # Release the previous setting's indexes so the RSS difference covers only this build
+    gc.collect()
+    rss_before = current_rss_bytes()
+    start = time.perf_counter()
+    store_for, store_against, store_combined = indexer.build_case_indexes(
+        for_motion_doc, against_motion_doc,
+        chunk_size=chunk_size, overlap=overlap, min_chunk_size=min_chunk_size)
+    build_time = time.perf_counter() - start
+    rss_after = current_rss_bytes()
+    build_rss = rss_after - rss_before if rss_before is not None and rss_after is not None else None
+
+    stores = {"for": store_for, "against": store_against, "judge": store_combined}
+    index_bytes = sum(faiss.serialize_index(store.index).nbytes for store in stores.values() if store)
+    chunks = sum(store.index.ntotal for store in (store_for, store_against) if store)
+
+    results = []
+    for k in k_values:
+        latencies = []
+        recalls = []
+        overlaps = []
+        for query in queries:
+            store = stores[query["store"]]
+            query_k = k or (JudgeAgent.CONTEXT_K if query["store"] == "judge" else indexer.k)
+            for _ in range(repeats):
+                query_start = time.perf_counter()
+                docs = indexer.retrieve_relevant_text(query["text"], store, k=query_k)
+                latencies.append((time.perf_counter() - query_start) * 1000)
+            recall, covered = score_retrieval(docs, query["relevant"], documents)
+            recalls.append(recall)
+            overlaps.append(covered)
+
+        results.append({
+            "chunk_size": chunk_size,
+            "overlap": overlap,
+            "min_chunk_size": min_chunk_size,
+            "k": k or "default",
+            "chunks": chunks,
+            "build_time_s": round(build_time, 3),
+            "index_mb": round(index_bytes / 2 ** 20, 3),
+            # Growth in resident memory while building this setting's indexes
+            "build_rss_mb": round(build_rss / 2 ** 20, 1) if build_rss is not None else None,
+            "latency_p50_ms": round(percentile(latencies, 50), 3),
+            "latency_p90_ms": round(percentile(latencies, 90), 3),
+            "latency_p99_ms": round(percentile(latencies, 99), 3),
+            "recall": round(sum(recalls) / len(recalls), 3),
+            "overlap": round(sum(overlaps) / len(overlaps), 3),
+        })
+    return results
+
+def run_sweep(indexer, query_set, case_description, for_motion_doc, against_motion_doc,
+              chunk_sizes=(500,), overlaps=(100,), min_chunk_sizes=(200,), k_values=(None,), repeats=20):
+    """
+    Evaluate retrieval over every combination of chunking and index parameters
+
+    Args:
+        indexer: DocumentIndexer instance
+        query_set: Queries returned by load_query_set
+        case_description: Description of the legal case
+        for_motion_doc: Path to document arguing for the motion
+        against_motion_doc: Path to document arguing against the motion
+        chunk_sizes: Chunk sizes to try
+        overlaps: Chunk overlaps to try
+        min_chunk_sizes: Minimum chunk sizes to try
+        k_values: Values of k to try; None uses each agent's default
+        repeats: Number of timed retrievals per query
+
+    Returns:
+        List of result dictionaries
+    """
+    queries = resolve_queries(query_set, case_description)
+    documents = {}
+    for source, path in (("for_motion", for_motion_doc), ("against_motion", against_motion_doc)):
+        with open(path, "r", encoding="utf-8") as f:
+            documents[source] = f.read()
+    validate_query_set(query_set, documents)
+
+    results = []
+    for chunk_size, overlap, min_chunk_size in itertools.product(chunk_sizes, overlaps, min_chunk_sizes):
+        if overlap >= chunk_size or min_chunk_size >= chunk_size:
+            print(f"Skipping chunk_size={chunk_size}, overlap={overlap}, min_chunk_size={min_chunk_size}")
+            continue
+        results.extend(evaluate_config(
+            indexer, queries, documents, for_motion_doc, against_motion_doc,
+            chunk_size, overlap, min_chunk_size, k_values, repeats))
+    return results
@@ -1,7 +1,10 @@
-import re
 import os
+import time
+import asyncio
+from contextlib import nullcontext
 from datetime import datetime
-from app.utils.text_processing import extract_scores
+from app.config import build_trial_phases
+from app.results_store import ResultsStore
 
 class CourtSimulation:
     def __init__(self, 
@@ -10,7 +13,10 @@ class CourtSimulation:
                  lawyer_for, 
                  lawyer_against,
                  document_indexer,
-                 output_path):
+                 output_path,
+                 results_store=None,
+                 trial_phases=None,
+                 residency=None):
         """
         Initialize courtroom simulation
         
@@ -21,13 +27,26 @@ class CourtSimulation:
             lawyer_against: LawyerAgent against the motion
             document_indexer: DocumentIndexer instance
             output_path: Path to save transcript
+            results_store: Optional ResultsStore receiving per-turn records
+            trial_phases: Phase list from SimulationConfig.trial_phases (defaults to the standard trial)
+            residency: Optional ModelResidencyManager swapping agent models in and out
         """
         self.case_description = case_description
         self.judge = judge_agent
         self.lawyer_for = lawyer_for
         self.lawyer_against = lawyer_against
+        self.lawyers = {"for": lawyer_for, "against": lawyer_against}
         self.document_indexer = document_indexer
         self.output_path = output_path
+        self.results_store = results_store
+        self.trial_phases = trial_phases or build_trial_phases()
+        self.residency = residency
+        
+        # Order in which agents take turns, used to prefetch the next speaker's model
+        self.schedule = [agent for phase in self.trial_phases
+                         for agent in phase["speakers"] + (["judge"] if phase["judge"] else [])]
+        self.run_id = ResultsStore.new_run_id()
+        self.records = []
         
         self.transcript = []
         self.for_arguments = []
@@ -36,46 +55,62 @@ class CourtSimulation:
         self.for_scores = {"legal_reasoning": 0, "evidence": 0, "persuasiveness": 0}
         self.against_scores = {"legal_reasoning": 0, "evidence": 0, "persuasiveness": 0}
     
-    def add_to_transcript(self, text):
+    def add_to_transcript(self, text, event_type="text", **fields):
         """
-        Add text to the transcript and print to console
+        Add text to the transcript
         
         Args:
             text: Text to add
+            event_type: Kind of transcript event ("text", "phase", "statement", "verdict")
+            **fields: Extra event data, such as the Statement or phase
+            
+        Returns:
+            Transcript event dictionary with "type", "text" and any extra fields
         """
         self.transcript.append(text)
-        print(text)  # Print to console for monitoring
+        return dict(fields, type=event_type, text=text)
     
-    def update_scores(self, evaluation):
+    def run_turn(self, phase, agent, generate, *args, **kwargs):
         """
-        Extract and update scores for both sides
+        Run one agent turn and record its statistics
         
         Args:
-            evaluation: Judge's evaluation text
+            phase: Phase dictionary the turn belongs to
+            agent: Speaker ("for", "against" or "judge")
+            generate: Agent method producing a Statement
+            *args, **kwargs: Arguments passed to generate
+            
+        Returns:
+            Statement produced by the agent
         """
-        # Check if the evaluation text explicitly separates the two sides
-        if "Book Authors" in evaluation and "LLM Companies" in evaluation:
-            # Split by the section headers
-            parts = re.split(r"(Book Authors|LLM Companies)", evaluation)
-
-            for i, part in enumerate(parts):
-                if "Book Authors" in part and i + 1 < len(parts):
-                    for_text = parts[i] + parts[i + 1]
-                    for_scores = extract_scores(for_text)
-                    for key in for_scores:
-                        self.for_scores[key] += for_scores[key]
-
-                if "LLM Companies" in part and i + 1 < len(parts):
-                    against_text = parts[i] + parts[i + 1]
-                    against_scores = extract_scores(against_text)
-                    for key in against_scores:
-                        self.against_scores[key] += against_scores[key]
-        else:
-            # If no clear division, use the same scores for both
-            scores = extract_scores(evaluation)
-            for key in scores:
-                self.for_scores[key] += scores[key]
-                self.against_scores[key] += scores[key]
+        turn = len(self.records)
+        next_agent = self.schedule[turn + 1] if turn + 1 < len(self.schedule) else None
+        residency = self.residency.use(agent, next_agent) if self.residency else nullcontext()
+        
+        with residency:
+            start = time.perf_counter()
+            statement = generate(*args, **kwargs)
+            latency = time.perf_counter() - start
+        
+        self.records.append(ResultsStore.make_record(
+            self.run_id, len(self.records) + 1, phase["phase"], phase["round"], agent,
+            stats=statement.stats, latency=latency, scores=statement.scores))
+        return statement
+    
+    def update_scores(self, scores):
+        """
+        Add the judge's scores for a round to the running totals
+        
+        Args:
+            scores: Scores dictionary from the judge, or None if scoring failed
+        """
+        if scores is None:
+            print("Warning: judge produced no scores for this round; totals unchanged")
+            return
+        for key in scores["for"]:
+            self.for_scores[key] += scores["for"][key]
+        for key in scores["against"]:
+            self.against_scores[key] += scores["against"][key]
     
     def get_total_scores(self):
         """
@@ -88,127 +123,15 @@ class CourtSimulation:
         against_total = sum(self.against_scores.values())
         return for_total, against_total
     
-    def run_simulation(self):
+    def score_summary(self):
         """
-        Run the full courtroom simulation
+        Format the running scores for the transcript
+        
+        Returns:
+            Score summary text
         """
-        # Initialize transcript with header
-        self.add_to_transcript("================================")
-        self.add_to_transcript("AI COURTROOM PROCEEDINGS")
-        self.add_to_transcript(f"Date: {datetime.now().strftime('%Y-%m-%d')}")
-        self.add_to_transcript("Case: Authors vs. LLM Companies")
-        self.add_to_transcript("================================\n")
-        self.add_to_transcript(self.case_description.strip() + "\n")
-        
-        # PHASE 1: Opening Statements
-        self.add_to_transcript("\n===== OPENING STATEMENTS =====\n")
-        
-        # Book Authors (For motion) opening
-        for_opening = self.lawyer_for.generate_argument("opening", self.document_indexer)
-        self.add_to_transcript(for_opening + "\n")
-        self.for_arguments.append(for_opening)
-        
-        # LLM Companies (Against motion) opening
-        against_opening = self.lawyer_against.generate_argument("opening", self.document_indexer)
-        self.add_to_transcript(against_opening + "\n")
-        self.against_arguments.append(against_opening)
-        
-        # Judge evaluates openings
-        opening_eval = self.judge.evaluate_arguments(
-            for_opening, against_opening, "opening", self.document_indexer)
-        self.add_to_transcript(opening_eval + "\n")
-        self.judge_evaluations.append(opening_eval)
-        
-        # Update scores
-        self.update_scores(opening_eval)
-        
-        # PHASE 2: First Round of Rebuttals
-        self.add_to_transcript("\n===== FIRST REBUTTALS =====\n")
-        
-        # Extract just the statement part from opening arguments (removing agent labels)
-        against_opening_content = re.sub(r"^.*?\):\s*", "", against_opening)
-        for_opening_content = re.sub(r"^.*?\):\s*", "", for_opening)
-        
-        # For side rebuts against opening
-        for_rebuttal = self.lawyer_for.generate_argument(
-            "rebuttal", 
-            self.document_indexer,
-            rebuttal_to=against_opening_content
-        )
-        self.add_to_transcript(for_rebuttal + "\n")
-        self.for_arguments.append(for_rebuttal)
-        
-        # Against side rebuts for opening
-        against_rebuttal = self.lawyer_against.generate_argument(
-            "rebuttal",
-            self.document_indexer,
-            rebuttal_to=for_opening_content
-        )
-        self.add_to_transcript(against_rebuttal + "\n")
-        self.against_arguments.append(against_rebuttal)
-        
-        # Judge evaluates first rebuttals
-        rebuttal1_eval = self.judge.evaluate_arguments(
-            for_rebuttal, against_rebuttal, "rebuttal", self.document_indexer)
-        self.add_to_transcript(rebuttal1_eval + "\n")
-        self.judge_evaluations.append(rebuttal1_eval)
-        
-        # Update scores
-        self.update_scores(rebuttal1_eval)
-        
-        # PHASE 3: Second Round of Rebuttals
-        self.add_to_transcript("\n===== SECOND REBUTTALS =====\n")
-        
-        # Extract just the statement part from first rebuttals
-        against_rebuttal_content = re.sub(r"^.*?\):\s*", "", against_rebuttal)
-        for_rebuttal_content = re.sub(r"^.*?\):\s*", "", for_rebuttal)
-        
-        # For side rebuts against's first rebuttal
-        for_rebuttal2 = self.lawyer_for.generate_argument(
-            "rebuttal",
-            self.document_indexer,
-            rebuttal_to=against_rebuttal_content
-        )
-        self.add_to_transcript(for_rebuttal2 + "\n")
-        self.for_arguments.append(for_rebuttal2)
-        
-        # Against side rebuts for's first rebuttal
-        against_rebuttal2 = self.lawyer_against.generate_argument(
-            "rebuttal",
-            self.document_indexer,
-            rebuttal_to=for_rebuttal_content
-        )
-        self.add_to_transcript(against_rebuttal2 + "\n")
-        self.against_arguments.append(against_rebuttal2)
-        
-        # Judge evaluates second rebuttals
-        rebuttal2_eval = self.judge.evaluate_arguments(
-            for_rebuttal2, against_rebuttal2, "rebuttal", self.document_indexer)
-        self.add_to_transcript(rebuttal2_eval + "\n")
-        self.judge_evaluations.append(rebuttal2_eval)
-        
-        # Update scores
-        self.update_scores(rebuttal2_eval)
-        
-        # PHASE 4: Closing Arguments
-        self.add_to_transcript("\n===== CLOSING ARGUMENTS =====\n")
-        
-        # Book Authors closing
-        for_closing = self.lawyer_for.generate_argument("closing", self.document_indexer)
-        self.add_to_transcript(for_closing + "\n")
-        self.for_arguments.append(for_closing)
-        
-        # LLM Companies closing
-        against_closing = self.lawyer_against.generate_argument("closing", self.document_indexer)
-        self.add_to_transcript(against_closing + "\n")
-        self.against_arguments.append(against_closing)
-        
-        # PHASE 5: Final Verdict
-        self.add_to_transcript("\n===== FINAL VERDICT =====\n")
-        
-        # Display current scores
         for_total, against_total = self.get_total_scores()
-        score_summary = f"""
+        return f"""
 SCORES SUMMARY:
 BOOK AUTHORS:
 - Legal Reasoning: {self.for_scores['legal_reasoning']}
@@ -222,22 +145,126 @@ LLM COMPANIES:
 - Persuasiveness: {self.against_scores['persuasiveness']}
 - TOTAL: {against_total}
 """
-        self.add_to_transcript(score_summary)
+    
+    def iter_proceedings(self):
+        """
+        Run the courtroom simulation turn by turn
+        
+        Each step of the generator runs at most one agent turn, so callers can
+        stop between turns. The transcript and turn records are saved once the
+        last event has been consumed.
+        
+        Yields:
+            Transcript event dictionaries (see add_to_transcript)
+        """
+        # Initialize transcript with header
+        yield self.add_to_transcript("================================")
+        yield self.add_to_transcript("AI COURTROOM PROCEEDINGS")
+        yield self.add_to_transcript(f"Date: {datetime.now().strftime('%Y-%m-%d')}")
+        yield self.add_to_transcript("Case: Authors vs. LLM Companies")
+        yield self.add_to_transcript("================================\n")
+        yield self.add_to_transcript(self.case_description.strip() + "\n")
+        
+        # Most recent statement from each side, used for rebuttals and judging
+        latest = {}
+        
+        for phase in self.trial_phases:
+            yield self.add_to_transcript(f"\n===== {phase['title']} =====\n", "phase", phase=phase)
+            
+            # Both sides rebut what the opponent said in the previous phase
+            previous = dict(latest)
+            for side in phase["speakers"]:
+                opponent = "against" if side == "for" else "for"
+                rebuttal_to = previous[opponent].text if phase["rebut"] else None
+                statement = self.run_turn(
+                    phase, side, self.lawyers[side].generate_argument,
+                    phase["phase"],
+                    self.document_indexer,
+                    rebuttal_to=rebuttal_to,
+                    max_tokens=phase["max_tokens"]
+                )
+                (self.for_arguments if side == "for" else self.against_arguments).append(statement)
+                latest[side] = statement
+                yield self.add_to_transcript(str(statement) + "\n", "statement", statement=statement)
+            
+            if phase["judge"] == "evaluate":
+                evaluation = self.run_turn(
+                    phase, "judge", self.judge.evaluate_arguments,
+                    latest["for"].text, latest["against"].text, phase["phase"], self.document_indexer,
+                    max_tokens=phase["judge_max_tokens"])
+                self.judge_evaluations.append(evaluation)
+                self.update_scores(evaluation.scores)
+                yield self.add_to_transcript(str(evaluation) + "\n", "statement", statement=evaluation)
+            
+            elif phase["judge"] == "verdict":
+                # Display current scores
+                yield self.add_to_transcript(self.score_summary())
+                
+                # Judge renders final verdict
+                final_verdict = self.run_turn(
+                    phase, "judge", self.judge.evaluate_arguments,
+                    latest["for"].text, latest["against"].text, "FINAL", self.document_indexer,
+                    max_tokens=phase["judge_max_tokens"])
+                yield self.add_to_transcript(str(final_verdict), "statement", statement=final_verdict)
         
-        # Judge renders final verdict
-        final_verdict = self.judge.evaluate_arguments(
-            for_closing, against_closing, "FINAL", self.document_indexer)
-        self.add_to_transcript(final_verdict)
+        for_total, against_total = self.get_total_scores()
+        winner = "for" if for_total > against_total else "against"
+        self.records[-1]["verdict"] = winner
         
         # Add closing to transcript
-        self.add_to_transcript("\n================================")
-        winner = "BOOK AUTHORS" if for_total > against_total else "LLM COMPANIES"
-        self.add_to_transcript(f"The court rules in favor of: {winner}")
-        self.add_to_transcript("================================")
+        yield self.add_to_transcript("\n================================")
+        yield self.add_to_transcript(
+            f"The court rules in favor of: {'BOOK AUTHORS' if winner == 'for' else 'LLM COMPANIES'}",
+            "verdict", winner=winner, for_total=for_total, against_total=against_total)
+        yield self.add_to_transcript("================================")
         
-        # Save transcript to file
+        self.save_results()
+    
+    def save_results(self):
+        """
+        Save the transcript and append the turn records to the results store
+        """
         with open(self.output_path, "w", encoding="utf-8") as f:
             f.write("\n".join(self.transcript))
         
+        # Append structured per-turn records for cross-run analysis
+        if self.results_store:
+            self.results_store.write_run(self.run_id, self.records)
+    
+    def run_simulation(self):
+        """
+        Run the full courtroom simulation, printing the transcript as it is produced
+        
+        Returns:
+            List of transcript lines
+        """
+        for event in self.iter_proceedings():
+            print(event["text"])  # Print to console for monitoring
+        
         print(f"Courtroom simulation complete. Transcript saved to {self.output_path}")
-        return self.transcript 
\ No newline at end of file
+        return self.transcript
+    
+    async def run_simulation_async(self, executor=None):
+        """
+        Run the courtroom simulation without blocking the event loop
+        
+        Each turn runs in an executor while the loop stays free, so one process
+        can drive many trials whose agents share the same loaded models.
+        Cancelling the consuming task, or closing the iterator, stops the trial
+        after the turn in progress; nothing is saved for an unfinished trial.
+        
+        Args:
+            executor: concurrent.futures executor for generation (defaults to the loop's)
+            
+        Yields:
+            Transcript event dictionaries (see add_to_transcript)
+        """
+        loop = asyncio.get_running_loop()
+        proceedings = self.iter_proceedings()
+        finished = object()
+        
+        while True:
+            event = await loop.run_in_executor(executor, next, proceedings, finished)
+            if event is finished:
+                break
+            yield event
@@ -0,0 +1,24 @@
+class Statement:
+    def __init__(self, speaker, label, stage, text, stats=None, scores=None):
+        """
+        A single statement made in court by a lawyer or the judge
+
+        Args:
+            speaker: "for", "against" or "judge"
+            label: Display name of the speaker
+            stage: Stage the statement was made in ("opening", "rebuttal", "closing", "FINAL")
+            text: Statement content without any speaker label
+            stats: Token counts and retrieved chunk ids reported while generating it
+            scores: Judge's scores dictionary, if any
+        """
+        self.speaker = speaker
+        self.label = label
+        self.stage = stage
+        self.text = text
+        self.stats = stats or {}
+        self.scores = scores
+
+    def __str__(self):
+        """Format the statement as a labelled transcript entry"""
+        separator = "\n" if self.speaker == "judge" else " "
+        return f"{self.label} ({self.stage}):{separator}{self.text}"
@@ -1,5 +1,29 @@
 import re
+import json
+import threading
 import torch
+from transformers import LogitsProcessor, LogitsProcessorList
+from app.config import SCORE_CATEGORIES, SCORE_SIDES, SCORE_RANGE
+
+# Cache of decoded vocabularies, keyed by (tokenizer name, vocabulary size)
+_TOKEN_TABLES = {}
+
+# One lock per loaded model, so concurrent trials sharing a model take turns generating
+_MODEL_LOCKS = {}
+_MODEL_LOCKS_GUARD = threading.Lock()
+
+def model_lock(model):
+    """
+    Get the lock serializing generation on a model
+    
+    Args:
+        model: AI language model
+        
+    Returns:
+        threading.Lock shared by every caller using this model
+    """
+    with _MODEL_LOCKS_GUARD:
+        return _MODEL_LOCKS.setdefault(id(model), threading.Lock())
 
 def clean_response(response):
     """
@@ -27,7 +51,21 @@ def clean_response(response):
             
     return response.strip()
 
-def generate_response(prompt, model, tokenizer, max_tokens=250):
+def record_usage(stats, prompt_tokens, gen_tokens):
+    """
+    Accumulate token counts for a generation call
+    
+    Args:
+        stats: Dictionary to update, or None to skip recording
+        prompt_tokens: Number of prompt tokens fed to the model
+        gen_tokens: Number of tokens the model generated
+    """
+    if stats is None:
+        return
+    stats["prompt_tokens"] = stats.get("prompt_tokens", 0) + prompt_tokens
+    stats["gen_tokens"] = stats.get("gen_tokens", 0) + gen_tokens
+
+def generate_response(prompt, model, tokenizer, max_tokens=250, stats=None, context=None):
     """
     Generate a concise response from an AI model
     
@@ -36,6 +74,9 @@ def generate_response(prompt, model, tokenizer, max_tokens=250):
         model: AI language model
         tokenizer: Model tokenizer
         max_tokens: Maximum number of tokens to generate
+        stats: Optional dictionary that receives prompt and generated token counts
+        context: Optional dictionary that receives the token ids and key/value cache,
+            so generate_scores can continue without re-reading the prompt
         
     Returns:
         Generated response text
@@ -43,18 +84,26 @@ def generate_response(prompt, model, tokenizer, max_tokens=250):
     try:
         inputs = tokenizer(prompt, return_tensors="pt").to(model.device)
         
-        with torch.no_grad():
-            with torch.cuda.amp.autocast():
+        with model_lock(model), torch.no_grad():
+            with torch.autocast("cuda", enabled=model.device.type == "cuda"):
                 outputs = model.generate(
                     **inputs,
                     max_new_tokens=max_tokens,
                     temperature=0.7,
                     top_p=0.9,
                     do_sample=True,
-                    pad_token_id=tokenizer.eos_token_id
+                    pad_token_id=tokenizer.eos_token_id,
+                    return_dict_in_generate=True
                 )
+        sequences = outputs.sequences
+        
+        prompt_length = inputs["input_ids"].shape[1]
+        record_usage(stats, prompt_length, sequences.shape[1] - prompt_length)
+        if context is not None:
+            context["input_ids"] = sequences
+            context["past_key_values"] = outputs.past_key_values
         
-        response = tokenizer.decode(outputs[0], skip_special_tokens=True)
+        response = tokenizer.decode(sequences[0], skip_special_tokens=True)
         
         # Extract only the generated part (after the prompt)
         if response.startswith(prompt):
@@ -71,32 +120,263 @@ def generate_response(prompt, model, tokenizer, max_tokens=250):
         # Clean up memory
         torch.cuda.empty_cache()
 
-def extract_scores(evaluation):
+def _extend_context(model, context, suffix_ids, eos_token_id):
     """
-    Extract numeric scores from judge's evaluation text
-    
+    Append text to a previous generation, running only the new tokens through the model
+
     Args:
-        evaluation: Judge's evaluation text
-        
+        model: AI language model
+        context: Dictionary filled by generate_response
+        suffix_ids: Token ids of the text to append
+        eos_token_id: End-of-sequence token id, dropped from the end of the generation
+
     Returns:
-        Dictionary of scores
+        Tuple of (input ids, key/value cache covering all but the last id,
+        number of tokens run through the model)
     """
-    scores = {"legal_reasoning": 0, "evidence": 0, "persuasiveness": 0}
-    
-    # Look for patterns like "Legal Reasoning: 8", etc.
-    legal_match = re.search(r"Legal Reasoning:?\s*(\d+)", evaluation, re.IGNORECASE)
-    evidence_match = re.search(r"Evidence:?\s*(\d+)", evaluation, re.IGNORECASE)
-    persuasive_match = re.search(r"Persuasiveness:?\s*(\d+)", evaluation, re.IGNORECASE)
-    
-    if legal_match:
-        scores["legal_reasoning"] = int(legal_match.group(1))
-    if evidence_match:
-        scores["evidence"] = int(evidence_match.group(1))
-    if persuasive_match:
-        scores["persuasiveness"] = int(persuasive_match.group(1))
-        
-    # If no scores found, assign default scores
-    if sum(scores.values()) == 0:
-        scores = {"legal_reasoning": 7, "evidence": 7, "persuasiveness": 7}
-        
-    return scores 
\ No newline at end of file
+    previous = context["input_ids"]
+    # The token generated last was never fed back, so the cache stops one short
+    cached = previous.shape[1] - 1
+    if previous[0, -1].item() == eos_token_id:
+        previous = previous[:, :-1]
+    input_ids = torch.cat([previous, suffix_ids.to(previous.device)], dim=1)
+
+    # Leave the final token for generate, which expects to run it against the cache
+    past_key_values = context["past_key_values"]
+    pending = input_ids[:, cached:-1]
+    if pending.shape[1]:
+        attention_mask = torch.ones(input_ids.shape[0], input_ids.shape[1] - 1,
+                                    dtype=torch.long, device=input_ids.device)
+        outputs = model(input_ids=pending, attention_mask=attention_mask,
+                        past_key_values=past_key_values, use_cache=True)
+        past_key_values = outputs.past_key_values
+    return input_ids, past_key_values, input_ids.shape[1] - cached
+
+def _score_template():
+    """
+    Build the fixed skeleton of the judge's JSON scoring block
+
+    Returns:
+        List of segments; strings are literal JSON text and None marks a score slot
+    """
+    template = ["{"]
+    for side_index, side in enumerate(SCORE_SIDES):
+        template.append(f'"{side}":{{' if side_index == 0 else f'}},"{side}":{{')
+        for category_index, category in enumerate(SCORE_CATEGORIES):
+            prefix = "" if category_index == 0 else ","
+            template.append(f'{prefix}"{category}":')
+            template.append(None)
+    template.append("}}")
+
+    # Merge adjacent literals so each literal segment is matched as a whole
+    merged = []
+    for segment in template:
+        if segment is not None and merged and merged[-1] is not None:
+            merged[-1] += segment
+        else:
+            merged.append(segment)
+    return merged
+
+def _token_table(tokenizer):
+    """
+    Decode every vocabulary entry once so constrained decoding can match text
+
+    Args:
+        tokenizer: Model tokenizer
+
+    Returns:
+        Tuple of (list of token strings, dict mapping token string to token ids)
+    """
+    key = (tokenizer.name_or_path, len(tokenizer))
+    if key not in _TOKEN_TABLES:
+        strings = []
+        lookup = {}
+        for token_id in range(len(tokenizer)):
+            text = tokenizer.decode([token_id])
+            # SentencePiece drops the word-boundary marker when decoding a lone token
+            piece = tokenizer.convert_ids_to_tokens(token_id)
+            if isinstance(piece, str) and piece.startswith("\u2581") and not text.startswith(" "):
+                text = " " + text
+            strings.append(text)
+            if text:
+                lookup.setdefault(text, []).append(token_id)
+        _TOKEN_TABLES[key] = (strings, lookup)
+    return _TOKEN_TABLES[key]
+
+class ScoreLogitsProcessor(LogitsProcessor):
+    """Constrain generation to the judge's JSON scoring block"""
+
+    def __init__(self, tokenizer, prompt_length):
+        """
+        Initialize the scoring constraint
+
+        Args:
+            tokenizer: Model tokenizer
+            prompt_length: Number of prompt tokens preceding the generated block
+        """
+        self.prompt_length = prompt_length
+        self.eos_token_id = tokenizer.eos_token_id
+        self.template = _score_template()
+        self.token_strings, self.token_lookup = _token_table(tokenizer)
+        self.max_token_length = max(len(text) for text in self.token_lookup)
+
+        low, high = SCORE_RANGE
+        self.score_strings = [str(value) for value in range(low, high + 1)]
+
+        # Worst case is one token per literal character plus two per score, then EOS
+        literal_length = sum(len(segment) for segment in self.template if segment is not None)
+        slots = sum(1 for segment in self.template if segment is None)
+        self.max_tokens = literal_length + 2 * slots + 1
+
+    def _locate(self, text):
+        """
+        Find where generated text sits in the template
+
+        Args:
+            text: Text generated so far
+
+        Returns:
+            Tuple of (segment index, partial text within that segment)
+        """
+        position = 0
+        for index, segment in enumerate(self.template):
+            rest = text[position:]
+            if segment is None:
+                digits = re.match(r"\d{0,2}", rest).group(0)
+                if len(digits) == len(rest):
+                    return index, digits
+                position += len(digits)
+            else:
+                if len(rest) < len(segment):
+                    return index, rest
+                position += len(segment)
+        return len(self.template), ""
+
+    def _literal_tokens(self, literal):
+        """Token ids whose text is a prefix of the given literal"""
+        allowed = []
+        for length in range(1, min(len(literal), self.max_token_length) + 1):
+            allowed.extend(self.token_lookup.get(literal[:length], []))
+        return allowed
+
+    def _allowed_tokens(self, text):
+        """Token ids that keep the generated text a valid prefix of the template"""
+        index, partial = self._locate(text)
+        if index == len(self.template):
+            return [self.eos_token_id]
+
+        segment = self.template[index]
+        if segment is not None:
+            return self._literal_tokens(segment[len(partial):])
+
+        allowed = []
+        # Extend the partial score with digits that still form a score in range
+        for value in self.score_strings:
+            if value.startswith(partial) and value != partial:
+                allowed.extend(self.token_lookup.get(value[len(partial):], []))
+        # A complete score may be followed by the next literal
+        if partial in self.score_strings:
+            allowed.extend(self._literal_tokens(self.template[index + 1]))
+        return allowed
+
+    def __call__(self, input_ids, scores):
+        mask = torch.full_like(scores, float("-inf"))
+        for row in range(input_ids.shape[0]):
+            generated = input_ids[row, self.prompt_length:].tolist()
+            text = "".join(self.token_strings[token_id] for token_id in generated)
+            mask[row, self._allowed_tokens(text)] = 0
+        return scores + mask
+
+def generate_scores(prompt, model, tokenizer, stats=None, context=None):
+    """
+    Generate the judge's scores as a JSON block using constrained decoding
+
+    Args:
+        prompt: Input prompt text, ending where the JSON block should begin; with a
+            context, only the text that follows the previous generation
+        model: AI language model
+        tokenizer: Model tokenizer
+        stats: Optional dictionary that receives prompt and generated token counts
+        context: Optional dictionary filled by generate_response, whose cache is
+            reused so only the new prompt text is processed
+
+    Returns:
+        Dictionary of scores per side, or None if generation failed
+    """
+    try:
+        with model_lock(model), torch.no_grad():
+            with torch.autocast("cuda", enabled=model.device.type == "cuda"):
+                if context:
+                    suffix_ids = tokenizer(prompt, return_tensors="pt", add_special_tokens=False)["input_ids"]
+                    input_ids, past_key_values, processed = _extend_context(
+                        model, context, suffix_ids, tokenizer.eos_token_id)
+                else:
+                    input_ids = tokenizer(prompt, return_tensors="pt")["input_ids"].to(model.device)
+                    past_key_values = None
+                    processed = input_ids.shape[1]
+
+                prompt_length = input_ids.shape[1]
+                processor = ScoreLogitsProcessor(tokenizer, prompt_length)
+                outputs = model.generate(
+                    input_ids=input_ids,
+                    attention_mask=torch.ones_like(input_ids),
+                    past_key_values=past_key_values,
+                    max_new_tokens=processor.max_tokens,
+                    do_sample=False,
+                    logits_processor=LogitsProcessorList([processor]),
+                    pad_token_id=tokenizer.eos_token_id
+                )
+
+        record_usage(stats, processed, outputs.shape[1] - prompt_length)
+        return parse_scores(tokenizer.decode(outputs[0][prompt_length:], skip_special_tokens=True))
+    except Exception as e:
+        print(f"Error generating scores: {e}")
+        return None
+    finally:
+        # Clean up memory
+        torch.cuda.empty_cache()
+
+def parse_scores(text):
+    """
+    Parse the judge's JSON scoring block
+
+    Args:
+        text: JSON text produced by constrained decoding
+
+    Returns:
+        Dictionary mapping each side to its category scores
+
+    Raises:
+        ValueError: If the block is malformed or a score is out of range
+    """
+    data = json.loads(text)
+    low, high = SCORE_RANGE
+    scores = {}
+    for side in SCORE_SIDES:
+        scores[side] = {}
+        for category in SCORE_CATEGORIES:
+            value = data[side][category]
+            if not isinstance(value, int) or not low <= value <= high:
+                raise ValueError(f"Invalid {side} {category} score: {value!r}")
+            scores[side][category] = value
+    return scores
+
+def format_scores(scores):
+    """
+    Render parsed scores as a transcript line
+
+    Args:
+        scores: Dictionary returned by parse_scores
+
+    Returns:
+        Human-readable score summary
+    """
+    labels = {"for": "Book Authors", "against": "LLM Companies"}
+    parts = []
+    for side in SCORE_SIDES:
+        details = ", ".join(
+            f"{category.replace('_', ' ').title()}: {scores[side][category]}"
+            for category in SCORE_CATEGORIES
+        )
+        parts.append(f"{labels[side]}: {details}.")
+    return "Scores - " + " ".join(parts)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Retrieval Evaluation
+
+This script measures how well the document indexer serves the agents. It runs
+the agents' own retrieval queries (opening, rebuttal, closing, judge) against
+the briefs and reports index build time, index size, memory, query latency
+percentiles, and recall/overlap against a labelled query set, for every
+combination of the chunking and index parameters given.
+
+Usage:
+    python evaluate_retrieval.py --chunk_sizes 300,500,800
+                                 --overlaps 50,100
+                                 --k 3,5
+                                 --output retrieval_results.csv
+"""
+
+import os
+import csv
+import json
+import argparse
+from app.config import SimulationConfig
+from app.models.document_indexer import DocumentIndexer
+from app.retrieval_eval import load_query_set, run_sweep
+
+def int_list(value):
+    """Parse a comma-separated list of integers"""
+    try:
+        return [int(item) for item in value.split(",") if item]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected comma-separated integers, got '{value}'")
+
+def parse_arguments():
+    """Parse command line arguments"""
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Retrieval quality and latency evaluation")
+
+    parser.add_argument("--queries",
+                        default=os.path.join(base_dir, "data", "eval", "retrieval_queries.json"),
+                        help="Path to the labelled query set")
+    parser.add_argument("--for_motion_doc",
+                        help="Path to document with arguments for the motion")
+    parser.add_argument("--against_motion_doc",
+                        help="Path to document with arguments against the motion")
+    parser.add_argument("--chunk_sizes", type=int_list, default=[500],
+                        help="Comma-separated chunk sizes in characters")
+    parser.add_argument("--overlaps", type=int_list, default=[100],
+                        help="Comma-separated chunk overlaps in characters")
+    parser.add_argument("--min_chunk_sizes", type=int_list, default=[200],
+                        help="Comma-separated minimum chunk sizes in characters")
+    parser.add_argument("--k", type=int_list,
+                        help="Comma-separated numbers of chunks to retrieve "
+                             "(default: each agent's own setting)")
+    parser.add_argument("--repeats", type=int, default=20,
+                        help="Timed retrievals per query")
+    parser.add_argument("--output",
+                        help="Save results to a .csv or .json file")
+
+    return parser.parse_args()
+
+def main():
+    """Run the retrieval evaluation sweep"""
+    args = parse_arguments()
+    config = SimulationConfig(
+        for_motion_doc=args.for_motion_doc,
+        against_motion_doc=args.against_motion_doc
+    )
+
+    print("Loading embedding model...")
+    indexer = DocumentIndexer()
+
+    results = run_sweep(
+        indexer,
+        load_query_set(args.queries),
+        config.case_description,
+        config.for_motion_doc,
+        config.against_motion_doc,
+        chunk_sizes=args.chunk_sizes,
+        overlaps=args.overlaps,
+        min_chunk_sizes=args.min_chunk_sizes,
+        k_values=args.k or [None],
+        repeats=args.repeats
+    )
+    if not results:
+        print("No valid parameter combinations to evaluate")
+        return
+
+    # Print results as an aligned table
+    columns = list(results[0].keys())
+    widths = {column: max(len(column), *(len(str(row[column])) for row in results)) for column in columns}
+    print("\n" + "  ".join(column.rjust(widths[column]) for column in columns))
+    for row in results:
+        print("  ".join(str(row[column]).rjust(widths[column]) for column in columns))
+
+    if args.output:
+        with open(args.output, "w", newline="", encoding="utf-8") as f:
+            if args.output.endswith(".json"):
+                json.dump(results, f, indent=2)
+            else:
+                writer = csv.DictWriter(f, fieldnames=columns)
+                writer.writeheader()
+                writer.writerows(results)
+        print(f"\nResults saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
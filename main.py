@@ -12,6 +12,10 @@ Usage:
                   --for_motion_doc /path/to/for/motion/doc 
                   --against_motion_doc /path/to/against/motion/doc 
                   --output /path/to/output.txt
+                  [--results_dir /path/to/results]
+                  [--rebuttal_rounds 3 --token_budget rebuttal=120]
+                  [--offload disk --offload_dir /path/to/offload --gpu_budget 12]
+                  [--shared_dir /path/to/shared]
 """
 
 import os
@@ -19,11 +23,21 @@ import sys
 import argparse
 import torch
 from app.config import SimulationConfig
-from app.models.model_loader import load_model
+from app.models.model_loader import load_model, load_shared_model
+from app.models.residency import ModelResidencyManager
 from app.models.document_indexer import DocumentIndexer
 from app.lawyers import LawyerAgent
 from app.judge import JudgeAgent
 from app.simulation import CourtSimulation
+from app.results_store import ResultsStore
+
+def token_budget(value):
+    """Parse a PHASE=TOKENS token budget argument"""
+    name, _, tokens = value.partition("=")
+    try:
+        return name, int(tokens)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected PHASE=TOKENS, got '{value}'")
 
 def parse_arguments():
     """Parse command line arguments"""
@@ -43,6 +57,25 @@ def parse_arguments():
                         help="Path to save the transcript output")
     parser.add_argument("--case_description", 
                         help="Custom case description")
+    parser.add_argument("--results_dir", 
+                        help="Directory to append structured per-turn records to")
+    parser.add_argument("--rebuttal_rounds", type=int,
+                        help="Number of rebuttal rounds (1-10, default 2)")
+    parser.add_argument("--token_budget", type=token_budget, action="append",
+                        metavar="PHASE=TOKENS",
+                        help="Generation budget for a phase (opening, rebuttal, closing, "
+                             "evaluation, verdict); may be repeated")
+    parser.add_argument("--offload", choices=["cpu", "disk"],
+                        help="Keep only the active agent's model on the GPU, offloading "
+                             "idle models to CPU RAM or disk")
+    parser.add_argument("--offload_dir", 
+                        help="Directory for disk-offloaded model weights")
+    parser.add_argument("--gpu_budget", type=float,
+                        help="GiB of model weights allowed on the GPU at once when offloading "
+                             "(default: free GPU memory)")
+    parser.add_argument("--shared_dir", 
+                        help="Directory of memory-mapped indexes and model weights shared "
+                             "by simulation processes on this host")
     
     return parser.parse_args()
 
@@ -59,7 +92,14 @@ def main():
         transcript_output=args.output,
         judge_model_path=args.judge_model,
         lawyer_for_model_path=args.lawyer_for_model,
-        lawyer_against_model_path=args.lawyer_against_model
+        lawyer_against_model_path=args.lawyer_against_model,
+        results_dir=args.results_dir,
+        rebuttal_rounds=args.rebuttal_rounds,
+        token_budgets=dict(args.token_budget or []),
+        offload=args.offload,
+        offload_dir=args.offload_dir,
+        gpu_budget_gb=args.gpu_budget,
+        shared_dir=args.shared_dir
     )
     
     # Validate configuration
@@ -77,31 +117,42 @@ def main():
     print(f"Document for motion: {config.for_motion_doc}")
     print(f"Document against motion: {config.against_motion_doc}")
     print(f"Output transcript: {config.transcript_output}")
+    if config.results_dir:
+        print(f"Results directory: {config.results_dir}")
+    print(f"Rebuttal rounds: {config.rebuttal_rounds}")
+    if config.offload:
+        print(f"Model offload: {config.offload}")
+    if config.shared_dir:
+        print(f"Shared directory: {config.shared_dir}")
     print("===============================\n")
     
     # Initialize document indexer
     print("Setting up document retrieval system...")
-    document_indexer = DocumentIndexer()
-    
-    # Load and chunk documents
-    doc_for_chunks = document_indexer.load_and_chunk_document(config.for_motion_doc)
-    doc_against_chunks = document_indexer.load_and_chunk_document(config.against_motion_doc)
-    
-    # Create vector stores
-    vector_store_for = document_indexer.create_faiss_index(doc_for_chunks, "for_motion")
-    vector_store_against = document_indexer.create_faiss_index(doc_against_chunks, "against_motion")
+    document_indexer = DocumentIndexer(shared_dir=config.shared_dir)
     
-    # Create combined vector store
-    combined_chunks = doc_for_chunks + doc_against_chunks
-    combined_vector_store = document_indexer.create_faiss_index(combined_chunks)
+    # Chunk documents and create vector stores
+    vector_store_for, vector_store_against, combined_vector_store = document_indexer.build_case_indexes(
+        config.for_motion_doc, config.against_motion_doc)
     
     print("Document retrieval system ready")
     
     # Load AI models
     print("\nLoading AI models...")
-    judge_model, judge_tokenizer = load_model(config.judge_model_path)
-    lawyer_for_model, lawyer_for_tokenizer = load_model(config.lawyer_for_model_path)
-    lawyer_against_model, lawyer_against_tokenizer = load_model(config.lawyer_against_model_path)
+    if config.offload:
+        # Models are swapped onto the GPU one turn at a time
+        residency = ModelResidencyManager(offload=config.offload, offload_dir=config.offload_dir,
+                                          gpu_budget_gb=config.gpu_budget_gb)
+        load = residency.load
+    elif config.shared_dir:
+        # Weights are mapped from the shared directory and stay on the CPU
+        residency = None
+        load = lambda role, model_path: load_shared_model(model_path, config.shared_dir)
+    else:
+        residency = None
+        load = lambda role, model_path: load_model(model_path)
+    judge_model, judge_tokenizer = load("judge", config.judge_model_path)
+    lawyer_for_model, lawyer_for_tokenizer = load("for", config.lawyer_for_model_path)
+    lawyer_against_model, lawyer_against_tokenizer = load("against", config.lawyer_against_model_path)
     print("Models loaded successfully")
     
     # Create agents
@@ -130,13 +181,17 @@ def main():
     
     # Create and run simulation
     print("\nStarting courtroom simulation...\n")
+    results_store = ResultsStore(config.results_dir) if config.results_dir else None
     simulation = CourtSimulation(
         config.case_description,
         judge_agent,
         lawyer_for,
         lawyer_against,
         document_indexer,
-        config.transcript_output
+        config.transcript_output,
+        results_store=results_store,
+        trial_phases=config.trial_phases(),
+        residency=residency
     )
     
     # Run the simulation